@@ -1,8 +1,12 @@
 import streamlit as st
-import pandas as pd
 import numpy as np
-import pickle
+import io
+import itertools
+import joblib
+import logging
 import os
+import pathlib
+from threadpoolctl import ThreadpoolController
 
 # Page configuration
 st.set_page_config(
@@ -18,139 +22,389 @@ This application predicts loan eligibility based on applicant information using
 Fill in the form below and click 'Predict' to see if you're eligible for a loan.
 """)
 
-# Function to load model and preprocessor
+# Columns expected by the preprocessor, in training order, with their default values
+INPUT_DEFAULTS = {
+    'Age': 30,
+    'StatedMonthlyIncome': 5000.0,
+    'LoanAmount': 10000.0,
+    'EmploymentStatus': "Employed",
+    'CreditScore': 700,
+    'LoanTerm': 12,
+    'LoanPurpose': "Debt Consolidation",
+    'Delinquencies': 0
+}
+FEATURE_COLUMNS = list(INPUT_DEFAULTS)
+
+# Columns scaled by the preprocessor's numeric transformer, in its output order
+NUMERIC_COLUMNS = ['Age', 'StatedMonthlyIncome', 'LoanAmount', 'CreditScore', 'Delinquencies']
+
+# Columns one-hot encoded by the preprocessor's categorical transformer
+CATEGORICAL_COLUMNS = ['EmploymentStatus', 'LoanTerm', 'LoanPurpose']
+
+# Function to load a model artifact; the file is read in one call and unpickled from memory
+def load_artifact(path):
+    return joblib.load(io.BytesIO(pathlib.Path(path).read_bytes()))
+
+# Function to load the preprocessor and model as a single pipeline
 @st.cache_resource
-def load_model_and_preprocessor():
+def load_model_pipeline():
+    # Imported here so the page header renders before sklearn (and the pandas it pulls in) loads
+    import pandas as pd
+    from sklearn.pipeline import Pipeline
+    
     try:
-        with open('model.pkl', 'rb') as model_file:
-            model = pickle.load(model_file)
+        model = load_artifact('model.pkl')
+        preprocessor = load_artifact('preprocessor.pkl')
         
-        with open('preprocessor.pkl', 'rb') as preprocessor_file:
-            preprocessor = pickle.load(preprocessor_file)
-            
-        return model, preprocessor
+        # Both artifacts are already fitted, so the pipeline only chains them for prediction
+        pipeline = Pipeline([('preprocessor', preprocessor), ('model', model)])
+        
+        # Warm up with a dummy prediction so the first batch upload doesn't pay for lazy initialization
+        pipeline.predict_proba(pd.DataFrame({column: [default] for column, default in INPUT_DEFAULTS.items()}))
+        
+        return pipeline
     except FileNotFoundError:
         st.error("Model or preprocessor files not found. Please ensure 'model.pkl' and 'preprocessor.pkl' exist in the current directory.")
-        return None, None
+        return None
     except Exception as e:
         st.error(f"Error loading model or preprocessor: {str(e)}")
-        return None, None
+        return None
+
+# Load model pipeline
+pipeline = load_model_pipeline()
+
+# Checked once here so the prediction paths branch on it instead of catching AttributeError
+HAS_PROBA = hasattr(pipeline, 'predict_proba')
 
-# Load model and preprocessor
-model, preprocessor = load_model_and_preprocessor()
+# Options offered for each categorical input
+EMPLOYMENT_STATUS_OPTIONS = ["Employed", "Self-employed", "Unemployed"]
+LOAN_TERM_OPTIONS = [12, 36, 60]
+LOAN_PURPOSE_OPTIONS = ["Debt Consolidation", "Home Improvement", "Business", "Education", "Other"]
 
-# Create form for user inputs
-with st.form("loan_eligibility_form"):
-    st.subheader("Applicant Information")
+# Function to precompute the encoded categorical features for every combination the form can submit
+@st.cache_resource
+def build_categorical_grid(_pipeline):
+    import pandas as pd
     
-    col1, col2 = st.columns(2)
+    encoder = _pipeline.named_steps['preprocessor'].named_transformers_['cat']
+    combinations = list(itertools.product(EMPLOYMENT_STATUS_OPTIONS, LOAN_TERM_OPTIONS, LOAN_PURPOSE_OPTIONS))
+    grid_data = pd.DataFrame(combinations, columns=CATEGORICAL_COLUMNS)
     
-    with col1:
-        age = st.number_input("Age", min_value=18, max_value=100, value=30, help="Applicant's age in years")
-        
-        stated_monthly_income = st.number_input(
-            "Stated Monthly Income (USD)", 
-            min_value=0.0, 
-            max_value=100000.0, 
-            value=5000.0,
-            step=100.0,
-            help="Applicant's stated monthly income in USD"
-        )
+    encoded = encoder.transform(grid_data[encoder.feature_names_in_])
+    if hasattr(encoded, 'toarray'):
+        encoded = encoded.toarray()
+    return dict(zip(combinations, encoded.astype(np.float32)))
+
+# Function to get the fitted scaling parameters for the numeric inputs
+@st.cache_resource
+def get_numeric_scaling(_pipeline):
+    scaler = _pipeline.named_steps['preprocessor'].named_transformers_['num']
+    if list(scaler.feature_names_in_) != NUMERIC_COLUMNS:
+        raise ValueError(f"Preprocessor expects numeric columns {list(scaler.feature_names_in_)}, not {NUMERIC_COLUMNS}")
+    return scaler.mean_, scaler.scale_
+
+logger = logging.getLogger(__name__)
+
+# On-disk prediction cache, shared across workers and kept across restarts
+PREDICTION_CACHE_DIR = 'predcache'
+PREDICTION_CACHE_SIZE_LIMIT = 64 * 1024 * 1024
+
+# Bump whenever the feature row or the cached value changes, so older disk entries are never served
+PREDICTION_CACHE_VERSION = 1
+
+# Function to open the prediction cache; returns None if it can't be opened, since the cache is only an optimization
+@st.cache_resource
+def get_prediction_cache():
+    import diskcache
+    
+    try:
+        return diskcache.Cache(PREDICTION_CACHE_DIR, eviction_policy='least-recently-used', size_limit=PREDICTION_CACHE_SIZE_LIMIT)
+    except Exception:
+        logger.warning("Could not open the prediction cache in %r; predicting without it", PREDICTION_CACHE_DIR, exc_info=True)
+        return None
+
+# Function to look up a cached prediction, treating any cache error as a miss
+def read_cached_prediction(cache_key):
+    prediction_cache = get_prediction_cache()
+    if prediction_cache is None:
+        return None
+    try:
+        return prediction_cache.get(cache_key)
+    except Exception:
+        logger.warning("Prediction cache read failed; predicting with the model", exc_info=True)
+        return None
+
+# Function to store a prediction in the cache, ignoring any cache error
+def write_cached_prediction(cache_key, value):
+    prediction_cache = get_prediction_cache()
+    if prediction_cache is None:
+        return
+    try:
+        prediction_cache.set(cache_key, value)
+    except Exception:
+        logger.warning("Prediction cache write failed", exc_info=True)
+
+# Function to fingerprint the model artifacts, so predictions cached for an older model are never served
+@st.cache_resource
+def get_model_fingerprint():
+    return tuple((stat.st_size, stat.st_mtime_ns) for stat in map(os.stat, ('model.pkl', 'preprocessor.pkl')))
+
+# Function to get a controller for the BLAS/OpenMP libraries the model loaded; built once,
+# because scanning for the libraries on every call costs more than a single-row predict
+@st.cache_resource
+def get_threadpool_controller():
+    return ThreadpoolController()
+
+# Function to predict a single applicant, cached in memory and on disk on the input values
+@st.cache_data(max_entries=1024, show_spinner=False)
+def predict_applicant(age, stated_monthly_income, loan_amount, employment_status,
+                      credit_score, loan_term, loan_purpose, delinquencies):
+    cache_key = (PREDICTION_CACHE_VERSION, get_model_fingerprint(), age, stated_monthly_income, loan_amount,
+                 employment_status, credit_score, loan_term, loan_purpose, delinquencies)
+    cached = read_cached_prediction(cache_key)
+    if cached is not None:
+        return cached
+    
+    # Build the preprocessed feature row directly, bypassing the ColumnTransformer:
+    # standardized numeric inputs followed by the precomputed one-hot categorical block
+    mean, scale = get_numeric_scaling(pipeline)
+    categorical_features = build_categorical_grid(pipeline)[(employment_status, loan_term, loan_purpose)]
+    
+    # The forest casts its input to float32 anyway, so scale in float64 and store float32
+    # to get the same values without a copy inside predict_proba
+    numeric_features = np.array((age, stated_monthly_income, loan_amount, credit_score, delinquencies), dtype=np.float64)
+    numeric_features -= mean
+    numeric_features /= scale
+    
+    processed_data = np.empty((1, len(NUMERIC_COLUMNS) + len(categorical_features)), dtype=np.float32)
+    processed_data[0, :len(NUMERIC_COLUMNS)] = numeric_features
+    processed_data[0, len(NUMERIC_COLUMNS):] = categorical_features
+    
+    model = pipeline.named_steps['model']
+
+    # A single row is too small to benefit from BLAS/OpenMP thread pools, so cap them at one thread.
+    # The cap is process-wide while the block runs and is restored as soon as it exits
+    with get_threadpool_controller().limit(limits=1):
+        # Get prediction probability and derive the class from it, exactly as the model's predict would
+        if HAS_PROBA:
+            prediction_proba = model.predict_proba(processed_data)[0]
+            prediction = model.classes_[np.argmax(prediction_proba)]
+        else:
+            prediction_proba = None
+            prediction = model.predict(processed_data)[0]
+    
+    write_cached_prediction(cache_key, (prediction, prediction_proba))
+    return prediction, prediction_proba
+
+# Function to warm the single-applicant path once per process, so the encoding grid, scaling
+# parameters and caches it relies on are built before the first real submit. Failures are only
+# logged here; the single-applicant form reports them to the user when it hits the same error
+@st.cache_resource
+def warm_up_predict_applicant():
+    try:
+        predict_applicant(*INPUT_DEFAULTS.values())
+    except (ValueError, KeyError):
+        logger.warning("Warm-up of the single-applicant prediction failed", exc_info=True)
+
+if pipeline:
+    warm_up_predict_applicant()
+
+# Function to format a dollar amount for markdown, escaping '$' so it isn't read as LaTeX
+def format_usd(amount):
+    return f"\\${amount:,.2f}"
+
+# Single applicant form and prediction, rerun on its own when the form is submitted
+@st.experimental_fragment
+def single_applicant_fragment():
+    # Create form for user inputs
+    with st.form("loan_eligibility_form"):
+        st.subheader("Applicant Information")
+    
+        col1, col2 = st.columns(2)
+    
+        with col1:
+            age = st.number_input("Age", min_value=18, max_value=100, value=30, help="Applicant's age in years")
         
-        loan_amount = st.number_input(
-            "Loan Amount (USD)", 
-            min_value=1000.0, 
-            max_value=50000.0, 
-            value=10000.0,
-            step=500.0,
-            help="Requested loan amount in USD"
-        )
+            stated_monthly_income = st.number_input(
+                "Stated Monthly Income (USD)", 
+                min_value=0.0, 
+                max_value=100000.0, 
+                value=5000.0,
+                step=100.0,
+                help="Applicant's stated monthly income in USD"
+            )
         
-        employment_status = st.selectbox(
-            "Employment Status", 
-            options=["Employed", "Self-employed", "Unemployed"],
-            help="Current employment status of the applicant"
-        )
+            loan_amount = st.number_input(
+                "Loan Amount (USD)", 
+                min_value=1000.0, 
+                max_value=50000.0, 
+                value=10000.0,
+                step=500.0,
+                help="Requested loan amount in USD"
+            )
+        
+            employment_status = st.selectbox(
+                "Employment Status", 
+                options=EMPLOYMENT_STATUS_OPTIONS,
+                help="Current employment status of the applicant"
+            )
     
-    with col2:
-        credit_score = st.slider(
-            "Credit Score", 
-            min_value=300, 
-            max_value=850, 
-            value=700,
-            help="Applicant's credit score (FICO)"
-        )
+        with col2:
+            credit_score = st.slider(
+                "Credit Score", 
+                min_value=300, 
+                max_value=850, 
+                value=700,
+                help="Applicant's credit score (FICO)"
+            )
         
-        loan_term = st.selectbox(
-            "Loan Term (months)", 
-            options=[12, 36, 60],
-            help="Term of the loan in months"
-        )
+            loan_term = st.selectbox(
+                "Loan Term (months)", 
+                options=LOAN_TERM_OPTIONS,
+                help="Term of the loan in months"
+            )
         
-        loan_purpose = st.selectbox(
-            "Loan Purpose", 
-            options=["Debt Consolidation", "Home Improvement", "Business", "Education", "Other"],
-            help="Purpose of the loan"
-        )
+            loan_purpose = st.selectbox(
+                "Loan Purpose", 
+                options=LOAN_PURPOSE_OPTIONS,
+                help="Purpose of the loan"
+            )
         
-        delinquencies = st.number_input(
-            "Number of Delinquencies in the Last 2 Years", 
-            min_value=0, 
-            max_value=20, 
-            value=0,
-            help="Number of times the applicant was delinquent on payments in the last 2 years"
-        )
+            delinquencies = st.number_input(
+                "Number of Delinquencies in the Last 2 Years", 
+                min_value=0, 
+                max_value=20, 
+                value=0,
+                help="Number of times the applicant was delinquent on payments in the last 2 years"
+            )
     
-    # Submit button
-    submit_button = st.form_submit_button("Predict")
+        # Submit button
+        submit_button = st.form_submit_button("Predict")
 
-# Prediction logic
-if submit_button and model and preprocessor:
-    try:
-        # Create a DataFrame with the input values
-        input_data = pd.DataFrame({
-            'Age': [age],
-            'StatedMonthlyIncome': [stated_monthly_income],
-            'LoanAmount': [loan_amount],
-            'EmploymentStatus': [employment_status],
-            'CreditScore': [credit_score],
-            'LoanTerm': [loan_term],
-            'LoanPurpose': [loan_purpose],
-            'Delinquencies': [delinquencies]
-        })
-        
-        # Preprocess the input data
-        processed_data = preprocessor.transform(input_data)
-        
-        # Make prediction
-        prediction = model.predict(processed_data)[0]
-        
-        # Get prediction probability
-        prediction_proba = model.predict_proba(processed_data)[0]
-        confidence_score = prediction_proba[1] if prediction == 1 else prediction_proba[0]
+    # Prediction logic
+    if submit_button and pipeline:
+        try:
+            # Make prediction; repeat submissions are served from the cache
+            prediction, prediction_proba = predict_applicant(
+                age, stated_monthly_income, loan_amount, employment_status,
+                credit_score, loan_term, loan_purpose, delinquencies
+            )
+        except (ValueError, KeyError) as e:
+            st.error(f"Error during prediction: {str(e)}")
+            st.write("Please check your inputs and try again.")
+            return
         
         # Display prediction results
         st.subheader("Prediction Result")
         
         if prediction == 0:
             st.success("**Eligible for Loan**")
-            st.write(f"Confidence Score: {confidence_score:.2%}")
+            if HAS_PROBA:
+                st.write(f"Confidence Score: {prediction_proba[0]:.2%}")
             st.write("Congratulations! Based on the provided information, you are eligible for a loan.")
         else:
             st.error("**High Credit Risk**")
-            st.write(f"Confidence Score: {confidence_score:.2%}")
+            if HAS_PROBA:
+                st.write(f"Confidence Score: {prediction_proba[1]:.2%}")
             st.write("Based on the provided information, you are considered a high credit risk for this loan.")
         
         # Display a table of the input information for reference
+        income_text = format_usd(stated_monthly_income)
+        loan_amount_text = format_usd(loan_amount)
         st.subheader("Applicant Information Summary")
-        summary_data = {
-            "Parameter": ["Age", "Monthly Income (USD)", "Loan Amount (USD)", "Employment Status", 
-                         "Credit Score", "Loan Term (months)", "Loan Purpose", "Delinquencies"],
-            "Value": [age, f"${stated_monthly_income:,.2f}", f"${loan_amount:,.2f}", employment_status, 
-                     credit_score, loan_term, loan_purpose, delinquencies]
-        }
-        st.table(pd.DataFrame(summary_data))
+        st.markdown(
+            "| Parameter | Value |\n"
+            "|---|---|\n"
+            f"| Age | {age} |\n"
+            f"| Monthly Income (USD) | {income_text} |\n"
+            f"| Loan Amount (USD) | {loan_amount_text} |\n"
+            f"| Employment Status | {employment_status} |\n"
+            f"| Credit Score | {credit_score} |\n"
+            f"| Loan Term (months) | {loan_term} |\n"
+            f"| Loan Purpose | {loan_purpose} |\n"
+            f"| Delinquencies | {delinquencies} |"
+        )
+
+# Most row numbers listed in a batch error message before the rest are summarized as a count
+MAX_LISTED_ROWS = 20
+
+# Function to list the 1-based data row numbers flagged in a boolean Series, for error messages
+def format_row_numbers(mask):
+    rows = np.flatnonzero(mask.to_numpy())
+    listed = ", ".join(str(row + 1) for row in rows[:MAX_LISTED_ROWS])
+    if len(rows) > MAX_LISTED_ROWS:
+        listed += f" … and {len(rows) - MAX_LISTED_ROWS} more"
+    return listed
+
+# Batch upload and prediction, rerun on its own when a file is uploaded
+@st.experimental_fragment
+def batch_prediction_fragment():
+    st.subheader("Batch Prediction")
+    st.markdown(f"Upload a CSV file with the columns: {', '.join(FEATURE_COLUMNS)}.")
+    
+    uploaded = st.file_uploader("Batch CSV", type="csv")
+    
+    if uploaded is not None and pipeline:
+        import pandas as pd
         
-    except Exception as e:
-        st.error(f"Error during prediction: {str(e)}")
-        st.write("Please check your inputs and try again.")
\ No newline at end of file
+        try:
+            batch_data = pd.read_csv(uploaded)
+            batch_features = batch_data[FEATURE_COLUMNS]
+        except KeyError as e:
+            st.error(f"Uploaded file is missing required columns: {str(e)}")
+            return
+        except ValueError as e:
+            st.error(f"Could not read the uploaded file: {str(e)}")
+            return
+        
+        if batch_features.empty:
+            st.error("Uploaded file has no rows to score.")
+            return
+        
+        # Reject rows with blank numeric cells; the model would otherwise score them without complaint
+        missing_numeric = batch_features[NUMERIC_COLUMNS].isna().any(axis=1)
+        if missing_numeric.any():
+            st.error(f"Uploaded file has missing numeric values in rows: {format_row_numbers(missing_numeric)}")
+            return
+        
+        # Reject categories the form doesn't offer; the encoder ignores unknown labels and would score them as all zeros
+        invalid_categorical = (
+            ~batch_features['EmploymentStatus'].isin(EMPLOYMENT_STATUS_OPTIONS)
+            | ~batch_features['LoanTerm'].isin(LOAN_TERM_OPTIONS)
+            | ~batch_features['LoanPurpose'].isin(LOAN_PURPOSE_OPTIONS)
+        )
+        if invalid_categorical.any():
+            st.error(f"Uploaded file has missing or invalid categorical values in rows: {format_row_numbers(invalid_categorical)}")
+            return
+        
+        try:
+            # Score every row in a single vectorized call
+            if HAS_PROBA:
+                batch_proba = pipeline.predict_proba(batch_features)
+            else:
+                batch_prediction = pipeline.predict(batch_features)
+        except (ValueError, TypeError) as e:
+            st.error(f"Error during batch prediction: {str(e)}")
+            return
+        
+        if HAS_PROBA:
+            batch_prediction = pipeline.classes_[np.argmax(batch_proba, axis=1)]
+        
+        results = batch_data.copy()
+        results['Prediction'] = np.where(batch_prediction == 0, "Eligible for Loan", "High Credit Risk")
+        if HAS_PROBA:
+            results['Confidence Score'] = batch_proba.max(axis=1)
+        
+        st.dataframe(
+            results,
+            column_config={"Confidence Score": st.column_config.NumberColumn(format="%.2f")},
+            use_container_width=True
+        )
+
+single_tab, batch_tab = st.tabs(["Single Applicant", "Batch Prediction"])
+
+with single_tab:
+    single_applicant_fragment()
+
+with batch_tab:
+    batch_prediction_fragment()